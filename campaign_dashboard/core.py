@@ -0,0 +1,257 @@
+# --- Data Layer: sheet loading, caching and summary building shared by the dashboard UI ---
+import streamlit as st
+import pandas as pd
+import numpy as np
+import gspread
+import re
+from gspread.utils import absolute_range_name
+from oauth2client.service_account import ServiceAccountCredentials
+from pathlib import Path
+import tempfile
+import shutil
+
+REQUIRED_SHEETS = ["Daily report - Churn", "CS", "Node_def", "CTA_Def"]
+OPTIONAL_SHEETS = ["Base_Definitions", "Source_Def", "Audience_definition"]
+CACHE_DIR = Path(tempfile.gettempdir()) / "campaign_cache"
+SHEET_ID_RE = re.compile(r"/d/([a-zA-Z0-9-_]+)")
+NUMERIC_COLS = ["Sent", "Delivered", "Read", "Lead Count", "Replied"]
+DATE_FORMAT = "%Y-%m-%d"
+
+# --- Google Sheet Auth ---
+@st.cache_resource
+def load_sheet(sheet_url):
+    scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(
+        dict(st.secrets["google_service_account"]), scope
+    )
+    client = gspread.authorize(creds)
+    sheet_id = SHEET_ID_RE.search(sheet_url).group(1)
+    return client.open_by_key(sheet_id)
+
+# --- Sheet Values -> DataFrame ---
+def values_to_df(rows):
+    if not rows:
+        return pd.DataFrame()
+    header = [c.strip() for c in rows[0]]
+    # Same guard get_all_records() applied: repeated headers would collide as DataFrame columns
+    duplicates = sorted({c for c in header if header.count(c) > 1})
+    if duplicates:
+        raise ValueError(f"the header row contains duplicates: {duplicates}")
+    width = len(header)
+    # The Sheets API trims trailing empty cells, so pad each row back to the header width
+    body = [(row + [""] * width)[:width] for row in rows[1:]]
+    return pd.DataFrame(body, columns=header)
+
+# --- Date Parsing ---
+def parse_dates(col):
+    # An explicit format skips per-row inference, and a date-only format already lands on midnight;
+    # only the inferred fallback (another layout, possibly with times) needs normalising
+    dates = pd.to_datetime(col, format=DATE_FORMAT, errors="coerce", cache=True)
+    if dates.isna().all():
+        dates = pd.to_datetime(col, errors="coerce", cache=True).dt.normalize()
+    return dates
+
+# --- Column Cleanup ---
+def to_count(col):
+    # Formatted sheet values carry thousands separators ("1,200"); strip them as gspread's numericise did
+    if pd.api.types.is_string_dtype(col):
+        col = col.str.replace(",", "", regex=False)
+    return pd.to_numeric(col, errors="coerce")
+
+def coerce_numeric(df):
+    # Sheet values arrive as strings; convert the known counter columns in one vectorised pass
+    cols = [c for c in NUMERIC_COLS if c in df.columns]
+    if cols:
+        df[cols] = df[cols].apply(to_count)
+    return df
+
+def normalize_churn(df):
+    # Header fixes and date parsing run once per data refresh instead of on every summary build
+    if "Campaign ID" in df.columns:
+        df = df.rename(columns={"Campaign ID": "Camp_ID"})
+    if "Project" in df.columns and "Project Name" not in df.columns:
+        df = df.rename(columns={"Project": "Project Name"})
+    if "Date" in df.columns:
+        # Day-resolution dates so filters compare datetime64 values against day boundaries
+        df = df.assign(Date=parse_dates(df["Date"]))
+    return df
+
+def shrink_numeric(frame):
+    # Counters are already numeric (coerce_numeric runs in fetch_data). A groupby sum treats NaN as 0,
+    # so filling first lets whole-number counters share one int32 dtype
+    frame = frame.fillna(0)
+    if ((frame % 1 == 0) & (frame.abs() < 2**31)).all().all():
+        return frame.astype("int32")
+    # Anything else keeps its coerced int64/float64 dtype; float32 totals lose precision past 2**24
+    return frame
+
+# --- Pull Worksheets ---
+def pull_sheets(sheet, titles):
+    # Optional sheets are only requested when present; a missing range fails the whole batch
+    names = REQUIRED_SHEETS + [name for name in OPTIONAL_SHEETS if name in titles]
+
+    # Single values.batchGet round-trip for every worksheet
+    response = sheet.values_batch_get(
+        [absolute_range_name(name) for name in names], params={"majorDimension": "ROWS"}
+    )
+    frames = {}
+    for name, value_range in zip(names, response.get("valueRanges", [])):
+        try:
+            frames[name] = values_to_df(value_range.get("values", []))
+        except ValueError as e:
+            # A broken optional sheet is skipped, as before; a broken required sheet fails the load
+            if name in REQUIRED_SHEETS:
+                raise ValueError(f"{name}: {e}") from e
+    for name in OPTIONAL_SHEETS:
+        frames.setdefault(name, pd.DataFrame())
+    return frames
+
+# --- Parquet Cache ---
+def cache_path(sheet_id, modified_time):
+    # Keyed by the Drive modifiedTime, so any edit to the spreadsheet lands in a fresh directory
+    revision = re.sub(r"[^0-9A-Za-z]", "", modified_time)
+    return CACHE_DIR / f"{sheet_id}_{revision}"
+
+def read_cache(path):
+    try:
+        return {name: pd.read_parquet(path / f"{name}.parquet") for name in REQUIRED_SHEETS + OPTIONAL_SHEETS}
+    except Exception:
+        return None
+
+def write_cache(sheet_id, path, frames):
+    staging = None
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        # Stage the revision privately and rename it into place, so readers never see a half-written one
+        staging = Path(tempfile.mkdtemp(prefix=".staging_", dir=CACHE_DIR))
+        for name, df in frames.items():
+            df.to_parquet(staging / f"{name}.parquet", compression="zstd")
+        staging.rename(path)
+    except Exception:
+        # Best effort: if any sheet can't be stored (e.g. duplicate headers), read_cache misses and we re-pull
+        if staging is not None:
+            shutil.rmtree(staging, ignore_errors=True)
+        return
+
+    # Older revisions of this sheet are never read again; revisions are alphanumeric, so split on the last "_"
+    for old in CACHE_DIR.glob(f"{sheet_id}_*"):
+        if old != path and old.name.rsplit("_", 1)[0] == sheet_id:
+            shutil.rmtree(old, ignore_errors=True)
+
+# --- Fetch Data ---
+@st.cache_data(ttl=300)
+def fetch_data(sheet_url):
+    try:
+        sheet = load_sheet(sheet_url)
+
+        # A cache hit only needs the Drive revision; the worksheet listing is paid for on a miss alone
+        path = cache_path(sheet.id, sheet.get_lastUpdateTime())
+        frames = read_cache(path)
+        if frames is None:
+            frames = pull_sheets(sheet, {ws.title for ws in sheet.worksheets()})
+            write_cache(sheet.id, path, frames)
+
+        # Only the summary inputs are typed and renamed; the untouched frames back the raw sheet viewer
+        churn_df = normalize_churn(coerce_numeric(frames["Daily report - Churn"].copy()))
+        cs_df = coerce_numeric(frames["CS"].copy())
+
+        # CS is a many-to-one lookup for churn rows; flag repeated keys instead of silently picking one
+        if "Camp_ID" in cs_df.columns and cs_df["Camp_ID"].duplicated().any():
+            st.warning("⚠️ CS sheet has repeated Camp_IDs; the summary uses the first row for each.")
+
+        return churn_df, cs_df, frames
+    except Exception as e:
+        st.error(f"❌ Failed to load data:\n\n{e}")
+        st.stop()
+
+# --- Apply Filters ---
+def isin_mask(col, values):
+    # Categorical columns test integer codes instead of hashing every string;
+    # unknown values map to -1, which is also the NaN code, so they are dropped
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        codes = col.cat.categories.get_indexer(values)
+        return col.cat.codes.isin(codes[codes >= 0])
+    return col.isin(values)
+
+def apply_filters(df, date_range, campaign_filter, project_filter):
+    # Combine every filter into one plain bool array (no index alignment) and slice once
+    mask = np.ones(len(df), dtype=bool)
+
+    if date_range and len(date_range) == 2:
+        start, end = pd.Timestamp(date_range[0]), pd.Timestamp(date_range[1])
+        mask &= df["Date"].between(start, end).to_numpy()
+
+    if campaign_filter:
+        mask &= isin_mask(df["Camp_ID"], campaign_filter).to_numpy()
+
+    if project_filter:
+        mask &= isin_mask(df["Project Name"], project_filter).to_numpy()
+
+    return df.loc[mask]
+
+# --- KPI Percentages ---
+def percent(part, whole):
+    # One float64 divide into a preallocated buffer; rows with nothing sent read 0% instead of inf
+    part, whole = part.to_numpy(dtype=float), whole.to_numpy(dtype=float)
+    return np.round(np.divide(part, whole, out=np.zeros(whole.shape), where=whole > 0) * 100, 2)
+
+# --- Summary Preparation ---
+@st.cache_data(show_spinner=False, max_entries=64)
+def prepare_summary(churn_df, cs_df, date_range=(), campaign_filter=(), project_filter=()):
+    if "Date" not in churn_df.columns:
+        st.error("❌ 'Date' column not found in churn data.")
+        st.write(churn_df.columns.tolist())
+        st.stop()
+
+    # Group the churn rows on their own; CS descriptors are looked up per group afterwards
+    key_cols = ["Date", "Camp_ID", "Project Name", "Audience_ID", "Objectives"]
+
+    # Only keys and counters survive the groupby, so drop every other churn column up front
+    df = churn_df[[c for c in churn_df.columns if c in key_cols or c in NUMERIC_COLS]].copy()
+    group_cols = [c for c in key_cols if c in df.columns]
+    lookup_cols = [c for c in key_cols if c in cs_df.columns and c not in group_cols]
+
+    # Categorical keys let groupby use the integer codes instead of hashing every string
+    for c in group_cols[1:]:
+        df[c] = df[c].astype("category")
+
+    # Sidebar filters are pushed below the groupby so only the selected rows get aggregated;
+    # a Project Name that only exists in CS can't be filtered until after the lookup
+    project_in_churn = "Project Name" in df.columns
+    df = apply_filters(df, date_range, campaign_filter, project_filter if project_in_churn else ())
+
+    num_cols = [c for c in NUMERIC_COLS if c in df.columns]
+    if not num_cols:
+        st.error("❌ No valid numeric columns found for aggregation.")
+        st.stop()
+
+    df[num_cols] = shrink_numeric(df[num_cols])
+    # Re-consolidate so the counters sit in one contiguous 2-D block for the groupby kernel
+    df = df.copy()
+
+    summary = df.groupby(group_cols, observed=True, sort=False, as_index=False)[num_cols].sum()
+
+    if lookup_cols:
+        # Camp_ID is unique in the de-duplicated lookup, so each descriptor is a plain Series.map.
+        # Campaigns missing from CS stay in the summary with blank descriptors; grouping on the
+        # merged descriptors used to drop them silently along with their counts
+        lookup = cs_df[["Camp_ID"] + lookup_cols].drop_duplicates("Camp_ID").set_index("Camp_ID")
+        for c in lookup_cols:
+            summary[c] = summary["Camp_ID"].map(lookup[c])
+        summary = summary[group_cols + lookup_cols + num_cols]
+
+    if not project_in_churn:
+        summary = apply_filters(summary, (), (), project_filter)
+
+    if "Replied" in summary.columns and "Sent" in summary.columns:
+        summary["Reply %"] = percent(summary["Replied"], summary["Sent"])
+
+    if "Delivered" in summary.columns and "Sent" in summary.columns:
+        summary["Delivery %"] = percent(summary["Delivered"], summary["Sent"])
+
+    return summary
+
+# --- Filter Options ---
+@st.cache_data
+def filter_options(df):
+    return pd.unique(df["Camp_ID"].values).tolist(), pd.unique(df["Project Name"].values).tolist()